@@ -1,82 +1,22 @@
 import streamlit as st
 import pandas as pd
-from elo_predictor import build_elos, get_team_stats, predict_matchup
-import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pathlib import Path
+from elo_predictor import build_elos, get_team_stats, predict_matchup, predict_matchups
+import update_results
+
+HIST_CSV = Path("data/historical_results.csv")
 
 # ---------------------------
 # FETCH MATCHUPS (ESPN -> fallback PFR)
 # ---------------------------
-def fetch_from_espn(year, week):
-    url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
-    params = {"year": year, "week": week, "seasontype": 2}
-    resp = requests.get(url, params=params, timeout=20).json()
-    games = []
-    for event in resp.get("events", []):
-        comp = event["competitions"][0]
-        home = comp["competitors"][0]
-        away = comp["competitors"][1]
-        games.append({
-            "date": event["date"],
-            "home_team": home["team"]["displayName"],
-            "home_score": home["score"],
-            "away_team": away["team"]["displayName"],
-            "away_score": away["score"],
-            "status": comp["status"]["type"]["description"],
-            "source": "ESPN"
-        })
-    return games
-
-def fetch_from_pfr(year, week):
-    url = f"https://www.pro-football-reference.com/years/{year}/games.htm"
-    df = pd.read_html(url)[0]
-    df = df[df["Week"].apply(lambda x: str(x).isdigit())]
-    week_games = df[df["Week"].astype(int) == week]
-    games = []
-    for _, row in week_games.iterrows():
-        if "@" in str(row.get("Unnamed: 5", "")):
-            home_team = row["Loser/tie"]
-            away_team = row["Winner/tie"]
-        else:
-            home_team = row["Winner/tie"]
-            away_team = row["Loser/tie"]
-        games.append({
-            "date": row["Date"],
-            "home_team": home_team,
-            "away_team": away_team,
-            "home_score": None,
-            "away_score": None,
-            "status": "Scheduled",
-            "source": "PFR"
-        })
-    return games
-
-def current_year_week(prefer_upcoming: bool = True):
-    now = pd.Timestamp.now()
-    year = now.year
-    url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
-    try:
-        j = requests.get(url, params={"year": year, "seasontype": 2}, timeout=20).json()
-        wk = (j.get("week") or {}).get("number")
-        if not (isinstance(wk, int) and 1 <= wk <= 23):
-            return year, 1
-
-        if prefer_upcoming:
-            # If all games this week are final, and next week has events, advance
-            cw = requests.get(url, params={"year": year, "week": wk, "seasontype": 2}, timeout=20).json()
-            events = cw.get("events", [])
-            def is_final(ev):
-                try:
-                    st = ev["competitions"][0]["status"]["type"]
-                    return st.get("state") == "post" or "final" in st.get("description", "").lower()
-                except Exception:
-                    return False
-            if events and all(is_final(ev) for ev in events):
-                nxt = requests.get(url, params={"year": year, "week": wk + 1, "seasontype": 2}, timeout=20).json()
-                if nxt.get("events"):
-                    return year, wk + 1
-        return year, wk
-    except Exception:
-        return year, 1
+# The network fetchers live in update_results; cache them across reruns here.
+# PFR's schedule page (games.htm) only changes as games finish, so it can be reused for an hour
+fetch_from_pfr = st.cache_data(ttl=3600, show_spinner=False)(update_results.fetch_from_pfr)
+current_year_week = st.cache_data(ttl=300, show_spinner=False)(update_results.current_year_week)
+# How long ESPN may take before PFR is asked as well
+ESPN_HEDGE_SECONDS = 1.5
 
 
 def fetch_current_results(year=None, week=None):
@@ -84,10 +24,54 @@ def fetch_current_results(year=None, week=None):
         y, w = current_year_week()
         year = y if year is None else year
         week = w if week is None else week
-    games = fetch_from_espn(year, week)
-    if not games:
-        games = fetch_from_pfr(year, week)
-    return pd.DataFrame(games)
+    # Hedged request: ESPN gets a head start, and PFR is only asked when ESPN
+    # comes back empty, fails, or hasn't answered within ESPN_HEDGE_SECONDS.
+    # The worker calls the raw fetcher (st.cache_data needs the script thread's
+    # context); _schedule caches the combined result anyway.
+    pool = ThreadPoolExecutor(max_workers=1)
+    f_espn = pool.submit(update_results.fetch_from_espn, year, week)
+    pool.shutdown(wait=False)
+    try:
+        games = f_espn.result(timeout=ESPN_HEDGE_SECONDS)
+    except FuturesTimeout:
+        games = None  # still in flight
+    except Exception:
+        games = pd.DataFrame()
+    if games is not None and not games.empty:
+        return games
+
+    pfr = fetch_from_pfr(year, week)
+    if games is None and (f_espn.done() or pfr.empty):
+        # A slow ESPN may have answered meanwhile; prefer it, as above
+        try:
+            games = f_espn.result()
+        except Exception:
+            games = pd.DataFrame()
+        if not games.empty:
+            return games
+    return pfr
+
+# ---------------------------
+# CACHED LOADERS
+# ---------------------------
+@st.cache_data(show_spinner=False)
+def _load_elos(path: str, mtime: float):
+    # mtime is only part of the cache key: a rewritten CSV invalidates the entry
+    return build_elos(path)
+
+@st.cache_data(ttl=3600, show_spinner="Loading team stats…")
+def _team_stats(year):
+    return get_team_stats(year)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _schedule(year, week):
+    return fetch_current_results(year=year, week=week)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _predict(team_a, team_b, home_team, year, elos_mtime):
+    # elos/stats come from their own caches, so only cheap keys are hashed here
+    elos = _load_elos(str(HIST_CSV), elos_mtime)
+    return predict_matchup(team_a, team_b, elos, _team_stats(year), home_team=home_team)
 
 # ---------------------------
 # STREAMLIT APP
@@ -98,11 +82,20 @@ st.title("NFL ELO Predictor 🏈")
 year, week = current_year_week(prefer_upcoming=True)
 
 # Build ratings and team stats for the current season
-elos = build_elos("data/historical_results.csv")
-stats = get_team_stats(year)
+hist_mtime = HIST_CSV.stat().st_mtime
+elos = _load_elos(str(HIST_CSV), hist_mtime)
+stats = _team_stats(year)
 
 # Auto-fetch current matchups
-current_df = fetch_current_results(year=year, week=week)
+current_df = _schedule(year, week)
+
+# Home win probabilities for the whole slate, shared by the Predict button
+# and the Safest Picks table
+if not current_df.empty:
+    home = current_df["home_team"].to_numpy()
+    away = current_df["away_team"].to_numpy()
+    p_home = predict_matchups(home, away, elos, stats)
+    st.session_state["probs"] = dict(zip(away + "@" + home, p_home))
 
 if not current_df.empty:
     st.subheader(f"📅 Week {week} Matchups ({year})")
@@ -110,26 +103,39 @@ if not current_df.empty:
 else:
     st.warning("No games found for this week. Try later.")
 
-# Select game from schedule
-if not current_df.empty:
-    games = current_df.apply(lambda x: f"{x['away_team']} @ {x['home_team']}", axis=1).tolist()
-    game_choice = st.selectbox("Choose a game", games)
-    row = current_df.iloc[games.index(game_choice)]
-    team_a = row["home_team"]
-    team_b = row["away_team"]
-    home_team = team_a
-else:
-    # fallback manual mode
-    team_a = st.selectbox("Select Team A", list(elos.keys()))
-    team_b = st.selectbox("Select Team B", list(elos.keys()))
-    home_team = st.selectbox("Home Team (optional)", ["None"] + list(elos.keys()))
-    home_team = None if home_team == "None" else home_team
-
-# Single prediction
-if st.button("Predict Selected Game"):
-    result = predict_matchup(team_a, team_b, elos, stats, home_team=home_team)
-    st.write(f"**{team_a} win probability:** {result['final_prob']:.2%}")
-    st.write(f"**{team_b} win probability:** {1-result['final_prob']:.2%}")
+# ---------------------------
+# SINGLE GAME PREDICTION
+# ---------------------------
+# A fragment reruns on its own widget events, so picking a game or clicking
+# Predict doesn't re-run the schedule fetch or the Safest Picks table.
+@st.fragment
+def single_game_ui(current_df, elos, year, hist_mtime):
+    # Select game from schedule
+    if not current_df.empty:
+        games = (current_df["away_team"] + " @ " + current_df["home_team"]).tolist()
+        game_pos = dict(zip(games, range(len(games))))
+        game_choice = st.selectbox("Choose a game", games)
+        row = current_df.iloc[game_pos[game_choice]]
+        team_a = row["home_team"]
+        team_b = row["away_team"]
+        home_team = team_a
+    else:
+        # fallback manual mode
+        team_a = st.selectbox("Select Team A", list(elos.keys()))
+        team_b = st.selectbox("Select Team B", list(elos.keys()))
+        home_team = st.selectbox("Home Team (optional)", ["None"] + list(elos.keys()))
+        home_team = None if home_team == "None" else home_team
+
+    # Single prediction: scheduled games were already scored with the slate
+    if st.button("Predict Selected Game"):
+        if current_df.empty:
+            prob_a = _predict(team_a, team_b, home_team, year, hist_mtime).final_prob
+        else:
+            prob_a = st.session_state["probs"][f"{team_b}@{team_a}"]
+        st.write(f"**{team_a} win probability:** {prob_a:.2%}")
+        st.write(f"**{team_b} win probability:** {1-prob_a:.2%}")
+
+single_game_ui(current_df, elos, year, hist_mtime)
 
 # ---------------------------
 # RANKED SAFEST PICKS
@@ -137,20 +143,17 @@ if st.button("Predict Selected Game"):
 if not current_df.empty:
     st.subheader("🔒 Safest Picks This Week")
 
-    ranked = []
-    for _, row in current_df.iterrows():
-        team_a = row["home_team"]
-        team_b = row["away_team"]
-        result = predict_matchup(team_a, team_b, elos, stats, home_team=team_a)
-
-        ranked.append({
-            "Matchup": f"{team_b} @ {team_a}",
-            "Favorite": team_a if result["final_prob"] >= 0.5 else team_b,
-            "Favorite Win %": max(result["final_prob"], 1 - result["final_prob"]),
-            "Underdog": team_b if result["final_prob"] >= 0.5 else team_a,
-            "Underdog Win %": min(result["final_prob"], 1 - result["final_prob"])
-        })
-
-    ranked_df = pd.DataFrame(ranked).sort_values("Favorite Win %", ascending=False)
+    home_fav = p_home >= 0.5
+    fav_p = np.maximum(p_home, 1 - p_home)
+
+    # Build the table once, already in ranked order
+    order = np.argsort(-fav_p, kind="stable")
+    ranked_df = pd.DataFrame({
+        "Matchup": (away + " @ " + home)[order],
+        "Favorite": np.where(home_fav, home, away)[order],
+        "Favorite Win %": fav_p[order],
+        "Underdog": np.where(home_fav, away, home)[order],
+        "Underdog Win %": (1 - fav_p)[order]
+    }, index=order)
     st.dataframe(ranked_df)
 
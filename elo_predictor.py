@@ -1,11 +1,36 @@
+import json
+import os
+import time
+from functools import lru_cache
+from typing import NamedTuple
 import pandas as pd
 import numpy as np
-import requests
+from update_results import read_pfr_table, write_json_atomic
+
+__all__ = [
+    "expected_score", "update_elo", "build_elos", "get_team_stats",
+    "Prediction", "blend_prob", "precompute_stats_lookup", "predict_matchup", "predict_matchups", "predict_week",
+]
 
 START_ELO = 1500
 K = 20
 HOME_FIELD_BONUS = 65  # ~2 points of NFL advantage
 
+# Franchise renames/relocations -> current name, so a team's rating carries
+# over instead of restarting at START_ELO (ESPN reports current names)
+TEAM_ALIASES = {
+    "Washington Redskins": "Washington Commanders",
+    "Washington Football Team": "Washington Commanders",
+    "Oakland Raiders": "Las Vegas Raiders",
+    "San Diego Chargers": "Los Angeles Chargers",
+    "St. Louis Rams": "Los Angeles Rams",
+}
+
+STATS_TTL = 3600  # seconds an in-process get_team_stats result stays fresh
+
+# Bump when the replay logic changes so stale .elos.json sidecars are rebuilt
+_ELO_CACHE_VERSION = 2
+
 # ---------------------------
 # ELO FUNCTIONS
 # ---------------------------
@@ -27,90 +52,141 @@ def update_elo(elo_a, elo_b, score_a, score_b):
     new_elo_b = elo_b + K * (result_b - exp_b)
     return new_elo_a, new_elo_b
 
+# Every column _game_results may read, across all supported schemas
+_RESULT_COLUMNS = {
+    "Winner/tie", "Loser/tie",
+    "Points_Winner", "Points_Loser", "PtsW", "PtsL", "Pts", "Pts.1",
+    "home_team", "away_team", "home_score", "away_score",
+}
+
+def _game_results(df):
+    """
+    Normalize a results frame to (winners, losers, winner_pts, loser_pts)
+    arrays in file order. The schema is detected once for the whole frame.
+    """
+    cols = set(map(str, df.columns))
+
+    def score(col):
+        # Same coercion as int(pd.to_numeric(x)): junk -> NaN, floats truncated
+        return np.trunc(pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float))
+
+    # Case A: Winner/Loser present (typical PFR tables)
+    if {"Winner/tie", "Loser/tie"} <= cols:
+        winners = df["Winner/tie"].to_numpy(dtype=object)
+        losers = df["Loser/tie"].to_numpy(dtype=object)
+
+        # Per row, take the first score column pair with both values present;
+        # if scores are missing everywhere, still record a 1-0 win/loss
+        sw = np.ones(len(df))
+        sl = np.zeros(len(df))
+        unset = np.ones(len(df), dtype=bool)
+        for wcol, lcol in [("Points_Winner","Points_Loser"),
+                           ("PtsW","PtsL"),
+                           ("Pts","Pts.1")]:
+            if {wcol, lcol} <= cols:
+                w, l = score(wcol), score(lcol)
+                take = unset & ~np.isnan(w) & ~np.isnan(l)
+                sw[take], sl[take] = w[take], l[take]
+                unset &= ~take
+        return winners, losers, sw, sl
+
+    # Case B: Home/Away present (custom schedule/results CSV)
+    if {"home_team","away_team", "home_score", "away_score"} <= cols:
+        hs, as_ = score("home_score"), score("away_score")
+
+        # Need actual scores to decide winner; skip if absent
+        played = ~np.isnan(hs) & ~np.isnan(as_)
+        home = df["home_team"].to_numpy(dtype=object)[played]
+        away = df["away_team"].to_numpy(dtype=object)[played]
+        hs, as_ = hs[played], as_[played]
+
+        # Ties are credited to the home side as "winner" (scores stay level)
+        away_won = as_ > hs
+        return (np.where(away_won, away, home), np.where(away_won, home, away),
+                np.where(away_won, as_, hs), np.where(away_won, hs, as_))
+
+    # Unknown schema -> no games
+    empty = np.array([], dtype=object)
+    return empty, empty, np.array([]), np.array([])
+
+def _run_elo(w_idx, l_idx, sw, sl, n_teams):
+    """
+    Replay games in order over dense team ids and return the final ratings.
+    The recurrence is sequential, so it runs on plain lists with update_elo's
+    arithmetic inlined: nothing but float math executes per game.
+    """
+    ratings = [START_ELO] * n_teams
+    for w, l, a, b in zip(w_idx.tolist(), l_idx.tolist(), sw.tolist(), sl.tolist()):
+        elo_w, elo_l = ratings[w], ratings[l]
+        exp_w = 1 / (1 + 10 ** ((elo_l - elo_w) / 400))
+        result_w = 1 if a > b else (0 if a < b else 0.5)
+        ratings[w] = elo_w + K * (result_w - exp_w)
+        ratings[l] = elo_l + K * ((1 - result_w) - (1 - exp_w))
+    return ratings
+
+def _replay_elos(csv_path):
+    # Only parse the columns _game_results can use; absent ones are just skipped
+    df = pd.read_csv(csv_path, usecols=lambda c: c in _RESULT_COLUMNS)
+    winners, losers, sw, sl = _game_results(df)
+
+    # Interleave winner/loser so team ids (and the returned dict) follow
+    # first-appearance order, exactly as the old row-by-row loop did
+    both = np.empty(2 * len(winners), dtype=object)
+    both[0::2], both[1::2] = winners, losers
+    both = pd.Series(both, dtype=object).replace(TEAM_ALIASES).to_numpy()
+    codes, teams = pd.factorize(both, use_na_sentinel=False)
+
+    ratings = _run_elo(codes[0::2], codes[1::2], sw, sl, len(teams))
+    return dict(zip(teams, ratings))
+
+def _elo_cache_path(csv_path):
+    head, tail = os.path.split(csv_path)
+    return os.path.join(head, f".{tail}.elos.json")
+
 def build_elos(csv_path="data/historical_results.csv"):
     """
     Build ELOs from a historical results CSV, tolerating different schemas:
       • PFR game logs:      Winner/tie, Loser/tie, Pts, Pts.1
       • Some exports:       Winner/tie, Loser/tie, PtsW, PtsL
       • Custom schedules:   home_team, away_team, home_score, away_score
-    """
-    import math
-    df = pd.read_csv(csv_path)
-    elos = {}
-
-    # helpers
-    def as_int(x):
-        v = pd.to_numeric(x, errors="coerce")
-        return int(v) if pd.notna(v) and not math.isnan(v) else None
-
-    def row_to_winner_loser_with_scores(row):
-        cols = set(map(str, df.columns))
-
-        # Case A: Winner/Loser present (typical PFR tables)
-        if {"Winner/tie", "Loser/tie"} <= cols:
-            winner = row["Winner/tie"]
-            loser  = row["Loser/tie"]
-
-            # Try several score column pairs in order
-            for wcol, lcol in [("Points_Winner","Points_Loser"),
-                               ("PtsW","PtsL"),
-                               ("Pts","Pts.1")]:
-                if {wcol, lcol} <= cols:
-                    sw = as_int(row.get(wcol))
-                    sl = as_int(row.get(lcol))
-                    if sw is not None and sl is not None:
-                        return winner, loser, sw, sl
-
-            # If scores missing, still record a win/loss
-            return winner, loser, 1, 0
-
-        # Case B: Home/Away present (custom schedule/results CSV)
-        if {"home_team","away_team"} <= cols:
-            home, away = row["home_team"], row["away_team"]
-            hs = as_int(row.get("home_score"))
-            as_ = as_int(row.get("away_score"))
-
-            # Need actual scores to decide winner; skip if absent
-            if hs is None or as_ is None:
-                return None
-
-            if hs > as_:
-                return home, away, hs, as_
-            elif as_ > hs:
-                return away, home, as_, hs
-            else:
-                # tie
-                return home, away, hs, as_
-
-        # Unknown schema -> skip
-        return None
-
-    for _, row in df.iterrows():
-        parsed = row_to_winner_loser_with_scores(row)
-        if not parsed:
-            continue
-        winner, loser, sw, sl = parsed
-
-        # init if needed
-        if winner not in elos:
-            elos[winner] = START_ELO
-        if loser not in elos:
-            elos[loser] = START_ELO
-
-        elos[winner], elos[loser] = update_elo(elos[winner], elos[loser], sw, sl)
 
+    The finished ratings are cached next to the CSV (.<name>.elos.json), keyed
+    on its mtime and size, so an unchanged file is never replayed twice.
+    """
+    info = os.stat(csv_path)
+    key = [info.st_mtime_ns, info.st_size, _ELO_CACHE_VERSION]
+    cache_path = _elo_cache_path(csv_path)
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return cached["elos"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    elos = _replay_elos(csv_path)
+
+    write_json_atomic(cache_path, {"key": key, "elos": elos})
     return elos
 
-
 # ---------------------------
 # TEAM STATS SCRAPER
 # ---------------------------
 def get_team_stats(year=None):
+    """
+    Season team stats indexed by Team. Memoized in-process per year for up to
+    STATS_TTL seconds; every caller gets its own copy of the cached frame.
+    """
     if year is None:
         year = pd.Timestamp.now().year
+    # The time bucket is part of the key so a long-lived process (Streamlit)
+    # still refreshes once per STATS_TTL instead of pinning the first result
+    return _team_stats_frozen(year, int(time.time() // STATS_TTL)).copy()
+
+@lru_cache(maxsize=8)
+def _team_stats_frozen(year, _bucket):
     url = f"https://www.pro-football-reference.com/years/{year}/"
-    tables = pd.read_html(url)
-    stats = tables[0]
+    stats = read_pfr_table(url, "AFC")  # first table on the page
 
     # Ensure 'TO' and 'Yds' columns exist before renaming
     if 'TO' not in stats.columns:
@@ -129,12 +205,56 @@ def get_team_stats(year=None):
     stats = stats[["Team", "Points_For", "Points_Against", "Turnovers", "Yards"]]
     stats["Points_For"] = pd.to_numeric(stats["Points_For"], errors='coerce')
     stats["Points_Against"] = pd.to_numeric(stats["Points_Against"], errors='coerce')
+    # Division header rows ("AFC East", ...) have no points; they aren't teams
+    stats = stats[stats["Points_For"].notna()].copy()
     stats["Point_Diff"] = stats["Points_For"] - stats["Points_Against"]
-    return stats.set_index("Team")
+
+    # Season totals are small ints: int16 is ample (a fixed width, so scalar
+    # differences in predict_matchup can't overflow), 32 team labels -> category.
+    # Columns that still have gaps stay float64.
+    for c in ("Points_For", "Points_Against", "Turnovers", "Yards", "Point_Diff"):
+        col = pd.to_numeric(stats[c], errors="coerce")
+        stats[c] = col.astype("int16") if col.notna().all() else col
+    stats = stats.set_index("Team")
+    stats.index = stats.index.astype("category")
+    return stats
 
 # ---------------------------
 # HYBRID PREDICTION
 # ---------------------------
+class Prediction(NamedTuple):
+    """predict_matchup's result; probabilities are from team_a's side."""
+    team_a: str
+    team_b: str
+    elo_prob: float
+    point_diff_factor: float
+    turnover_factor: float
+    final_prob: float
+
+def blend_prob(elo_prob, point_diff_factor, turnover_factor):
+    # Shared numeric core of the scalar and batch predictors; plain arithmetic,
+    # so it works unchanged on floats and ndarrays.
+    return (
+        0.6 * elo_prob +
+        0.25 * point_diff_factor +
+        0.15 * turnover_factor
+    )
+
+def precompute_stats_lookup(stats):
+    """
+    {team: ndarray([Point_Diff, Turnovers])}. Pass it to predict_matchup in
+    place of the stats frame when predicting many games against the same stats.
+    """
+    rows = np.column_stack([stats["Point_Diff"].to_numpy(dtype=float),
+                            stats["Turnovers"].to_numpy(dtype=float)])
+    return dict(zip(stats.index, rows))
+
+def _stats_row(stats, team):
+    # Single-game path straight off the frame: two scalar .at reads, no Series
+    if team not in stats.index:
+        return None
+    return np.array([stats.at[team, "Point_Diff"], stats.at[team, "Turnovers"]], dtype=float)
+
 def predict_matchup(team_a, team_b, elos, stats, home_team=None):
     # ELO base
     elo_a = elos.get(team_a, START_ELO)
@@ -147,39 +267,60 @@ def predict_matchup(team_a, team_b, elos, stats, home_team=None):
 
     elo_prob = expected_score(elo_a, elo_b)
 
-    # Team stats factors
-    stat_a = stats.loc[team_a] if team_a in stats.index else None
-    stat_b = stats.loc[team_b] if team_b in stats.index else None
+    # Team stats factors; `stats` is the stats frame or its precomputed lookup
+    if isinstance(stats, dict):
+        stat_a, stat_b = stats.get(team_a), stats.get(team_b)
+    else:
+        stat_a, stat_b = _stats_row(stats, team_a), _stats_row(stats, team_b)
 
     point_diff_factor = 0.5
     turnover_factor = 0.5
 
     if stat_a is not None and stat_b is not None:
-        pd_a = stat_a["Point_Diff"]
-        pd_b = stat_b["Point_Diff"]
-        point_diff_factor = (pd_a - pd_b) / 200.0 + 0.5  # normalize
+        point_diff_factor = (stat_a[0] - stat_b[0]) / 200.0 + 0.5  # normalize
+        turnover_factor = (stat_b[1] - stat_a[1]) / 50.0 + 0.5  # fewer TO = better
 
-        to_a = -stat_a["Turnovers"]  # fewer TO = better
-        to_b = -stat_b["Turnovers"]
-        turnover_factor = (to_a - to_b) / 50.0 + 0.5
+    # Scalar clip without NumPy ufunc dispatch (NaN passes through, as with np.clip)
+    final_prob = blend_prob(elo_prob, point_diff_factor, turnover_factor)
+    final_prob = 0.0 if final_prob < 0.0 else (1.0 if final_prob > 1.0 else final_prob)
 
-    # Blend
-    final_prob = (
-        0.6 * elo_prob +
-        0.25 * point_diff_factor +
-        0.15 * turnover_factor
-    )
+    return Prediction(team_a, team_b, elo_prob, point_diff_factor,
+                      turnover_factor, final_prob)
+
+def predict_matchups(home_teams, away_teams, elos, stats):
+    """
+    Vectorized predict_matchup over a slate of games, with the home side of
+    each game getting HOME_FIELD_BONUS. Returns the home teams' final win
+    probabilities as an ndarray aligned with the inputs.
+    """
+    # Dense integer ids for the teams on the slate: every per-team lookup below
+    # runs once per team, then games just index arrays by code.
+    home = np.asarray(home_teams, dtype=object)
+    away = np.asarray(away_teams, dtype=object)
+    cat = pd.Categorical(np.concatenate([home, away]))
+    codes = cat.codes.reshape(2, -1)
+    teams = cat.categories
+    # A blank team name (None/NaN) gets code -1, which indexes the extra slot
+    # appended to each per-team array: START_ELO and no stats, as in
+    # predict_matchup. The bonus mirrors its `home_team == team_a` test, which
+    # fails for a NaN home team (NaN never equals itself) but not for None.
+    bonus = np.where(home == home, HOME_FIELD_BONUS, 0)
+
+    # ELO base
+    elo_arr = np.array([elos.get(t, START_ELO) for t in teams] + [START_ELO], dtype=float)
+    elo_h = elo_arr[codes[0]] + bonus
+    elo_a = elo_arr[codes[1]]
+    elo_prob = expected_score(elo_h, elo_a)
 
-    final_prob = np.clip(final_prob, 0, 1)
+    # Team stats factors (neutral 0.5 unless both teams have stats)
+    has_arr = np.append(teams.isin(stats.index), False)
+    pd_arr = np.append(stats["Point_Diff"].reindex(teams).to_numpy(dtype=float), np.nan)
+    to_arr = np.append(stats["Turnovers"].reindex(teams).to_numpy(dtype=float), np.nan)
+    has_stats = has_arr[codes[0]] & has_arr[codes[1]]
+    point_diff_factor = np.where(has_stats, (pd_arr[codes[0]] - pd_arr[codes[1]]) / 200.0 + 0.5, 0.5)
+    turnover_factor = np.where(has_stats, (to_arr[codes[1]] - to_arr[codes[0]]) / 50.0 + 0.5, 0.5)
 
-    return {
-        "team_a": team_a,
-        "team_b": team_b,
-        "elo_prob": elo_prob,
-        "point_diff_factor": point_diff_factor,
-        "turnover_factor": turnover_factor,
-        "final_prob": final_prob
-    }
+    return np.clip(blend_prob(elo_prob, point_diff_factor, turnover_factor), 0, 1)
 
 # ---------------------------
 # MAIN INTERACTIVE LOOP
@@ -193,13 +334,11 @@ def predict_week(csv_path="data/current_results.csv",
     stats = get_team_stats(year)
     current = pd.read_csv(csv_path)
 
-    print("\n📊 Weekly Suicide Pool Predictions\n")
-    for _, game in current.iterrows():
-        home = game["home_team"]
-        away = game["away_team"]
+    # Score the whole slate in one vectorized pass
+    probs = predict_matchups(current["home_team"], current["away_team"], elos, stats)
 
-        result = predict_matchup(home, away, elos, stats, home_team=home)
-        prob_home = result["final_prob"]
+    print("\n📊 Weekly Suicide Pool Predictions\n")
+    for home, away, prob_home in zip(current["home_team"], current["away_team"], probs):
         prob_away = 1 - prob_home
 
         print(f"{away} @ {home}")
@@ -1,61 +1,80 @@
+import io
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from update_results import http_session, read_pfr_rows
+
+# Column layout of data/historical_results.csv. Every scraped frame is cast to
+# it, so concatenating seasons needs no column union or dtype upcasting.
+HISTORY_COLUMNS = [
+    "Week", "Day", "Date", "Time", "Winner/tie", "Unnamed: 5", "Loser/tie", "Unnamed: 7",
+    "Points_Winner", "Points_Loser", "Yards_Winner", "Turnovers_Winner",
+    "Yards_Loser", "Turnovers_Loser", "season",
+]
+_HISTORY_INTS = [
+    "Week", "Points_Winner", "Points_Loser", "Yards_Winner", "Turnovers_Winner",
+    "Yards_Loser", "Turnovers_Loser", "season",
+]
+
+def _to_history_schema(df):
+    df = df.reindex(columns=HISTORY_COLUMNS)
+    for c in _HISTORY_INTS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int16")
+    return df
+
+# Finished seasons never change, so their pages can sit in the HTTP cache for
+# a month; the in-progress season keeps the session's hourly revalidation.
+COMPLETED_SEASON_TTL = pd.Timedelta(days=30)
+
+def _season_complete(year):
+    # A season runs into early February of the next calendar year
+    today = pd.Timestamp.now()
+    return year < today.year - (today.month < 3)
+
+# data-stat of each games.htm cell -> its column in the history CSV. Keying on
+# data-stat rather than header text also covers Pts/PtsW label changes.
+_GAMES_STATS = {
+    "week_num": "Week", "game_day_of_week": "Day", "game_date": "Date", "gametime": "Time",
+    "winner": "Winner/tie", "game_location": "Unnamed: 5", "loser": "Loser/tie",
+    "boxscore_word": "Unnamed: 7", "pts_win": "Points_Winner", "pts_lose": "Points_Loser",
+    "yards_win": "Yards_Winner", "to_win": "Turnovers_Winner",
+    "yards_lose": "Yards_Loser", "to_lose": "Turnovers_Loser",
+}
 
 def scrape_season(year):
     """Scrape a full NFL season from Pro-Football-Reference, keeping only completed games."""
     url = f"https://www.pro-football-reference.com/years/{year}/games.htm"
-    tables = pd.read_html(url)
-    df = tables[0]  # first table is schedule
-    df = df[df["Week"].apply(lambda x: str(x).isdigit())]  # filter real weeks
-    df = df.rename(columns={
-        "Pts": "Points_Winner",
-        "Pts.1": "Points_Loser",
-        "YdsW": "Yards_Winner",
-        "YdsL": "Yards_Loser",
-        "TOW": "Turnovers_Winner",
-        "TOL": "Turnovers_Loser"
-    })
-    # Some PFR tables use PtsW/PtsL instead of Pts/Pts.1 — normalize those too
-    if "PtsW" in df.columns and "Points_Winner" not in df.columns:
-        df = df.rename(columns={"PtsW": "Points_Winner"})
-    if "PtsL" in df.columns and "Points_Loser" not in df.columns:
-        df = df.rename(columns={"PtsL": "Points_Loser"})
+    ttl = COMPLETED_SEASON_TTL if _season_complete(year) else None
+    df = read_pfr_rows(url, "games", _GAMES_STATS, expire_after=ttl).rename(columns=_GAMES_STATS)
+    # filter real weeks: playoff labels coerce to NaN
+    week = pd.to_numeric(df["Week"], errors="coerce")
+    df = df[week.notna()].assign(Week=week.dropna().astype("int16"))
 
     # keep only rows where both scores are present (completed games)
-    if {"Points_Winner", "Points_Loser"} <= set(df.columns):
-        pw = pd.to_numeric(df["Points_Winner"], errors="coerce")
-        pl = pd.to_numeric(df["Points_Loser"], errors="coerce")
-        df = df[pw.notna() & pl.notna()].copy()
-    else:
-        # If Points_* are still absent, attempt a last-chance filter on any numeric-looking score cols
-        for wcol, lcol in [("PtsW","PtsL"), ("Pts","Pts.1")]:
-            if {wcol, lcol} <= set(df.columns):
-                pw = pd.to_numeric(df[wcol], errors="coerce")
-                pl = pd.to_numeric(df[lcol], errors="coerce")
-                df = df[pw.notna() & pl.notna()].copy()
-                # normalize names for downstream consumers
-                df = df.rename(columns={wcol: "Points_Winner", lcol: "Points_Loser"})
-                break
+    pw = pd.to_numeric(df["Points_Winner"], errors="coerce")
+    pl = pd.to_numeric(df["Points_Loser"], errors="coerce")
+    df = df[pw.notna() & pl.notna()].copy()
     df["season"] = year
-    return df
+    return _to_history_schema(df)
 
 def scrape_historical(years=5, out_path="data/historical_results.csv"):
     current_year = pd.Timestamp.now().year
-    frames = []
     # include the current season as well
-    for y in range(current_year - years, current_year + 1):
-        print(f"Fetching {y} season...")
-        frames.append(scrape_season(y))
+    seasons = list(range(current_year - years, current_year + 1))
+    print(f"Fetching {seasons[0]}-{seasons[-1]} seasons...")
+    # Network-bound: overlap the per-season requests; map() keeps season order
+    with ThreadPoolExecutor(max_workers=6) as ex:
+        frames = list(ex.map(scrape_season, seasons))
 
     df_all = pd.concat(frames, ignore_index=True)
     df_all.to_csv(out_path, index=False)
     print(f"✅ Saved historical results to {out_path}")
-import requests
 
 def _espn_current_week(year: int) -> int | None:
     try:
         url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
         params = {"seasontype": 2, "dates": year}
-        data = requests.get(url, params=params, timeout=15).json()
+        data = http_session().get(url, params=params, timeout=15).json()
         wk = (data.get("week") or {}).get("number")
         if isinstance(wk, int) and 1 <= wk <= 23:
             return wk
@@ -66,26 +85,26 @@ def _espn_current_week(year: int) -> int | None:
 def _pfr_max_completed_week(year: int) -> int | None:
     try:
         url = f"https://www.pro-football-reference.com/years/{year}/games.htm"
-        df = pd.read_html(url)[0]
-        df = df[df["Week"].apply(lambda x: str(x).isdigit())].copy()
+        df = read_pfr_rows(url, "games", ["week_num", "pts_win", "pts_lose"])
+        # One vectorized pass: playoff rows ("WildCard") become NaN
+        wk = pd.to_numeric(df["week_num"], errors="coerce")
         # Only consider rows with scores (completed), so max reflects finished weeks
-        if {"Pts","Pts.1"} <= set(df.columns):
-            pw = pd.to_numeric(df["Pts"], errors="coerce")
-            pl = pd.to_numeric(df["Pts.1"], errors="coerce")
-            df = df[pw.notna() & pl.notna()]
-        return int(df["Week"].astype(int).max())
+        pw = pd.to_numeric(df["pts_win"], errors="coerce")
+        pl = pd.to_numeric(df["pts_lose"], errors="coerce")
+        wk = wk[pw.notna() & pl.notna()]
+        return int(wk.max())
     except Exception:
         return None
 
 def _scrape_week_from_pfr(year: int, week: int) -> pd.DataFrame:
     url = f"https://www.pro-football-reference.com/years/{year}/week_{week}.htm"
     try:
-        tables = pd.read_html(url)
+        # lxml builds only the table whose text matches; no match raises ValueError
+        df = pd.read_html(io.StringIO(http_session().get(url, timeout=20).text),
+                          flavor="lxml", match=r"Winner/tie")[0]
     except Exception:
         return pd.DataFrame()
-
-    df = next((t for t in tables if {"Winner/tie","Loser/tie"}.issubset(set(map(str, t.columns)))), None)
-    if df is None:
+    if not {"Winner/tie","Loser/tie"}.issubset(map(str, df.columns)):
         return pd.DataFrame()
 
     # normalize to your column names
@@ -107,7 +126,62 @@ def _scrape_week_from_pfr(year: int, week: int) -> pd.DataFrame:
 
     df["season"] = year
     df["Week"] = int(week)
-    return df
+    return _to_history_schema(df)
+
+
+# Rows that identify a game; used to skip games already in the history CSV.
+# Reading them with fixed dtypes skips inference and keeps team names as codes.
+_KEY_COLS = ["season", "Week", "Date", "Winner/tie", "Loser/tie"]
+_KEY_DTYPES = {"season": "Int16", "Week": "Int16", "Winner/tie": "category", "Loser/tie": "category"}
+
+def _key_tuples(df):
+    # NaN never equals NaN; map missing cells to None so such keys still match
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+def append_this_week(df_week, out_path="data/historical_results.csv"):
+    """
+    Append the games in df_week that are not already in out_path and return
+    how many rows were written. Only the header and key columns of the
+    existing file are read, and the file is appended to, never rewritten.
+    """
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    if not os.path.exists(out_path):
+        df_week.to_csv(out_path, index=False)
+        return len(df_week)
+
+    header = pd.read_csv(out_path, nrows=0).columns.tolist()
+    # Frames cast to the history schema carry every column, so skip the ones
+    # this week has no data for (e.g. a week table without Date)
+    present = [c for c in df_week.columns if c in header and df_week[c].notna().any()]
+    key_cols = [c for c in _KEY_COLS if c in present] or present
+    dtypes = {c: t for c, t in _KEY_DTYPES.items() if c in key_cols}
+    existing = pd.read_csv(out_path, usecols=key_cols, dtype=dtypes)[key_cols]
+    existing_keys = set(_key_tuples(existing))
+    df_week = df_week.drop_duplicates(subset=key_cols, keep="first")
+    is_new = [k not in existing_keys for k in _key_tuples(df_week[key_cols])]
+    new_rows = df_week[is_new].reindex(columns=header)
+    new_rows.to_csv(out_path, mode="a", header=False, index=False)
+    return len(new_rows)
+
+
+def append_missing_weeks(year, through_week, out_path="data/historical_results.csv", max_workers=4):
+    """
+    Catch-up mode: scrape every week of `year` up to through_week that has no
+    rows in out_path yet, plus through_week itself (it may be partial), and
+    append them in one pass. Returns how many rows were written.
+    """
+    have = set()
+    if os.path.exists(out_path):
+        seen = pd.read_csv(out_path, usecols=["season", "Week"], dtype=_KEY_DTYPES)
+        have = set(seen.loc[seen["season"] == year, "Week"].dropna().tolist())
+    weeks = [w for w in range(1, through_week) if w not in have] + [through_week]
+
+    # Network-bound, but keep it to a few workers: PFR answers bursts with 429s
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        frames = [f for f in ex.map(_scrape_week_from_pfr, [year] * len(weeks), weeks) if not f.empty]
+    if not frames:
+        return 0
+    return append_this_week(pd.concat(frames, ignore_index=True), out_path)
 
 
 if __name__ == "__main__":
@@ -117,24 +191,13 @@ if __name__ == "__main__":
     year_now = pd.Timestamp.now().year
     wk = _espn_current_week(year_now) or _pfr_max_completed_week(year_now)
     if wk:
-        df_week = _scrape_week_from_pfr(year_now, wk)  # PFR data as requested
-        if not df_week.empty:
-            out_path = "data/historical_results.csv"
-            # de-dup append
-            import os
-            os.makedirs("data", exist_ok=True)
-            if os.path.exists(out_path):
-                existing = pd.read_csv(out_path)
-                key_cols = [c for c in ["season","Week","Date","Winner/tie","Loser/tie"] if c in df_week.columns and c in existing.columns]
-                if key_cols:
-                    merged = pd.concat([existing, df_week], ignore_index=True).drop_duplicates(subset=key_cols, keep="first")
-                else:
-                    merged = pd.concat([existing, df_week], ignore_index=True).drop_duplicates()
-                merged.to_csv(out_path, index=False)
-                print(f"✅ Appended {len(merged)-len(existing)} rows for {year_now} Week {wk} (PFR).")
-            else:
-                df_week.to_csv(out_path, index=False)
-                print(f"🆕 Created {out_path} with {len(df_week)} rows for {year_now} Week {wk} (PFR).")
+        out_path = "data/historical_results.csv"
+        existed = os.path.exists(out_path)
+        # Also picks up any earlier weeks a skipped run never added
+        n = append_missing_weeks(year_now, wk, out_path)
+        if existed:
+            print(f"✅ Appended {n} rows for {year_now} through Week {wk} (PFR).")
+        else:
+            print(f"🆕 Created {out_path} with {n} rows for {year_now} through Week {wk} (PFR).")
     else:
         print("⚠️ Could not determine current week via ESPN or PFR.")
-
@@ -1,87 +1,282 @@
-import requests
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import requests_cache
 import pandas as pd
+import lxml.html
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# sports-reference allows about 20 requests a minute and answers bursts with
+# 429s and an hour-long block, so PFR requests that reach the network are
+# spaced out; cache hits never get this far, and ESPN is not throttled.
+PFR_MIN_INTERVAL = 3.0
+
+class _Throttle:
+    """Lets callers start at most one request every `interval` seconds, across threads."""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        # Reserve the next slot under the lock, then sleep outside it
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
+# One limiter per process, shared by every adapter that talks to PFR
+_PFR_THROTTLE = _Throttle(PFR_MIN_INTERVAL)
+
+class _ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter that waits on a shared _Throttle before each send."""
+
+    def __init__(self, throttle, **kwargs):
+        super().__init__(**kwargs)
+        self._throttle = throttle
+
+    def send(self, request, **kwargs):
+        self._throttle.wait()
+        return super().send(request, **kwargs)
+
+_SESSION_LOCK = threading.Lock()
+
+def http_session():
+    """
+    Shared keep-alive session so the TLS handshake is paid once per process.
+    Responses are cached on disk, so repeat runs read unchanged ESPN/PFR pages
+    from data/http_cache.sqlite instead of the network. Expired pages are
+    revalidated with If-None-Match/If-Modified-Since, and a failed refresh
+    falls back to the stale copy.
+    """
+    # lru_cache alone lets concurrent first callers each build a session
+    with _SESSION_LOCK:
+        return _build_session()
+
+@lru_cache(maxsize=None)
+def _build_session():
+    s = requests_cache.CachedSession(
+        "data/http_cache",
+        expire_after=3600,
+        stale_if_error=True,
+        urls_expire_after={
+            "site.api.espn.com": 300,                        # live scoreboard
+            "*/games.htm": 3600,                             # season schedule/results
+            "www.pro-football-reference.com/years": 21600,   # standings, week pages
+        },
+    )
+    # Retry transient 429/5xx with exponential backoff; connection failures get
+    # only two quick retries so an offline run fails fast. Retry-After is not
+    # honored: sports-reference answers bursts with an hour-long block, and
+    # sleeping that out would hang the app.
+    retry = Retry(total=5, connect=2, read=2, backoff_factor=1.5,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  respect_retry_after_header=False, raise_on_status=False)
+    s.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    s.mount("https://www.pro-football-reference.com/",
+            _ThrottledAdapter(_PFR_THROTTLE, pool_maxsize=16, max_retries=retry))
+    s.headers["User-Agent"] = "nfl_suicide_pool/1.0"
+    return s
+
+def read_pfr_table(url, table_id):
+    """Download a PFR page and parse only <table id=table_id> into a DataFrame."""
+    html = http_session().get(url, timeout=20).text
+    tables = lxml.html.fromstring(html).xpath(f"//table[@id='{table_id}']")
+    if not tables:
+        raise ValueError(f"No table with id {table_id!r} at {url}")
+    fragment = lxml.html.tostring(tables[0], encoding="unicode")
+    return pd.read_html(io.StringIO(fragment), flavor="lxml")[0]
+
+def read_pfr_rows(url, table_id, stats, expire_after=None):
+    """
+    Download a PFR page and return the data-stat cells `stats` of each body row
+    of <table id=table_id> as a DataFrame of strings (None for empty cells).
+    Repeated header rows are skipped; nothing goes through read_html.
+    expire_after overrides the session's cache lifetime for this page.
+    """
+    html = http_session().get(url, timeout=20, expire_after=expire_after).content
+    tables = lxml.html.fromstring(html).xpath(f"//table[@id='{table_id}']")
+    if not tables:
+        raise ValueError(f"No table with id {table_id!r} at {url}")
+    cols = {stat: [] for stat in stats}
+    for tr in tables[0].xpath("tbody/tr[not(contains(@class, 'thead'))]"):
+        cells = {td.get("data-stat"): td.text_content().strip() for td in tr}
+        for stat, col in cols.items():
+            col.append(cells.get(stat) or None)
+    return pd.DataFrame(cols)
+
+def _competitor_name(c):
+    return (c.get("team") or {}).get("displayName") if c else None
+
+def _competitor_score(c):
+    return c.get("score") if c else None
 
 def fetch_from_espn(year, week):
-    """Fetch games for a given season/week from ESPN"""
+    """Fetch games for a given season/week from ESPN as a DataFrame"""
     url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
     params = {"year": year, "week": week, "seasontype": 2}
-    resp = requests.get(url, params=params, timeout=20).json()
+    resp = http_session().get(url, params=params, timeout=20).json()
 
-    games = []
+    # Collect primitives column-wise; one DataFrame at the end, no per-game dicts
+    dates, homes, home_scores, aways, away_scores, statuses = [], [], [], [], [], []
     for event in resp.get("events", []):
         comp = event["competitions"][0]
         home = comp["competitors"][0]
         away = comp["competitors"][1]
 
-        games.append({
-            "date": event["date"],
-            "home_team": home["team"]["displayName"],
-            "home_score": home["score"],
-            "away_team": away["team"]["displayName"],
-            "away_score": away["score"],
-            "status": comp["status"]["type"]["description"],
-            "source": "ESPN"
-        })
-    return games
+        dates.append(event["date"])
+        homes.append(_competitor_name(home))
+        home_scores.append(_competitor_score(home))
+        aways.append(_competitor_name(away))
+        away_scores.append(_competitor_score(away))
+        statuses.append(comp["status"]["type"]["description"])
+
+    return pd.DataFrame({
+        "date": dates,
+        "home_team": homes,
+        "home_score": home_scores,
+        "away_team": aways,
+        "away_score": away_scores,
+        "status": statuses,
+        "source": "ESPN"
+    })
+
+def _pfr_cell(tr, stat):
+    """Text of the cell PFR tags with data-stat=<stat> in a table row."""
+    return tr.xpath(f"string(*[@data-stat='{stat}'])").strip()
+
+def _pfr_score(text):
+    return int(text) if text.isdigit() else None
 
 def fetch_from_pfr(year, week):
-    """Fetch schedule from Pro-Football-Reference (works even before games are played)"""
+    """Fetch schedule from Pro-Football-Reference as a DataFrame (works even before games are played)"""
     url = f"https://www.pro-football-reference.com/years/{year}/games.htm"
-    df = pd.read_html(url)[0]
-    df = df[df["Week"].apply(lambda x: str(x).isdigit())]
-    week_games = df[df["Week"].astype(int) == week]
-
-    games = []
-    for _, row in week_games.iterrows():
-        # Determine home/away from '@' column
-        if "@" in str(row.get("Unnamed: 5", "")):
-            home_team = row["Loser/tie"]
-            away_team = row["Winner/tie"]
+    tree = lxml.html.fromstring(http_session().get(url, timeout=20).content)
+    # Pull only the target week's rows instead of building the whole season table
+    rows = tree.xpath(f"//table[@id='games']//tr[*[@data-stat='week_num']='{int(week)}']")
+
+    dates, homes, aways, home_scores, away_scores = [], [], [], [], []
+    for tr in rows:
+        winner, loser = _pfr_cell(tr, "winner"), _pfr_cell(tr, "loser")
+        pts_w, pts_l = _pfr_score(_pfr_cell(tr, "pts_win")), _pfr_score(_pfr_cell(tr, "pts_lose"))
+
+        # Determine home/away from the '@' (game_location) column
+        if "@" in _pfr_cell(tr, "game_location"):
+            home_team, away_team, home_score, away_score = loser, winner, pts_l, pts_w
         else:
-            home_team = row["Winner/tie"]
-            away_team = row["Loser/tie"]
-
-        home_score = row.get("Pts.1") if "Pts.1" in row else None
-        away_score = row.get("Pts") if "Pts" in row else None
-
-        games.append({
-            "date": row["Date"],
-            "home_team": home_team,
-            "away_team": away_team,
-            "home_score": home_score if pd.notna(home_score) else None,
-            "away_score": away_score if pd.notna(away_score) else None,
-            "status": "Scheduled" if pd.isna(home_score) else "Final",
-            "source": "PFR"
-        })
-    return games
+            home_team, away_team, home_score, away_score = winner, loser, pts_w, pts_l
+
+        dates.append(_pfr_cell(tr, "game_date"))
+        homes.append(home_team)
+        aways.append(away_team)
+        home_scores.append(home_score)
+        away_scores.append(away_score)
+
+    return pd.DataFrame({
+        "date": dates,
+        "home_team": homes,
+        "away_team": aways,
+        "home_score": home_scores,
+        "away_score": away_scores,
+        "status": ["Scheduled" if hs is None else "Final" for hs in home_scores],
+        "source": "PFR"
+    })
+
+def write_json_atomic(path, obj):
+    """
+    Write obj as JSON to path via a temp file and os.replace, so readers never
+    see a partial file. Each writer gets its own temp file, so concurrent
+    writers (the app and a CLI run) can't clobber each other's. Failures are
+    ignored: these files are only caches, and a read-only checkout should just
+    run without them.
+    """
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path) or ".",
+                                         prefix=os.path.basename(path) + ".",
+                                         suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except OSError:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+# The week number only moves once all of a week's games are final, so one
+# answer is good for half an hour, in-process and across CLI runs
+WEEK_TTL = 1800
+WEEK_CACHE = "data/.weekcache.json"
 
 def current_year_week(prefer_upcoming: bool = True):
-    now = pd.Timestamp.now()
-    year = now.year
-    url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
+    """
+    (year, week) to show, read from ESPN's scoreboard; (year, 1) if ESPN is
+    unreachable. Successful answers are memoized in-process and in WEEK_CACHE
+    for up to WEEK_TTL seconds.
+    """
+    year = pd.Timestamp.now().year
     try:
-        j = requests.get(url, params={"year": year, "seasontype": 2}, timeout=20).json()
-        wk = (j.get("week") or {}).get("number")
-        if not (isinstance(wk, int) and 1 <= wk <= 23):
-            return year, 1
-
-        if prefer_upcoming:
-            cw = requests.get(url, params={"year": year, "week": wk, "seasontype": 2}, timeout=20).json()
-            events = cw.get("events", [])
-            def is_final(ev):
-                try:
-                    st = ev["competitions"][0]["status"]["type"]
-                    return st.get("state") == "post" or "final" in st.get("description", "").lower()
-                except Exception:
-                    return False
-            if events and all(is_final(ev) for ev in events):
-                nxt = requests.get(url, params={"year": year, "week": wk + 1, "seasontype": 2}, timeout=20).json()
-                if nxt.get("events"):
-                    return year, wk + 1
-        return year, wk
+        return year, _cached_week(year, prefer_upcoming, int(time.time() // WEEK_TTL))
     except Exception:
         return year, 1
 
+@lru_cache(maxsize=4)
+def _cached_week(year, prefer_upcoming, _bucket):
+    key = "upcoming" if prefer_upcoming else "current"
+    cache = {}
+    try:
+        with open(WEEK_CACHE) as f:
+            cache = json.load(f)
+        hit = cache[key]
+        if hit["year"] == year and time.time() - hit["fetched_at"] < WEEK_TTL:
+            return hit["week"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    if not isinstance(cache, dict):
+        cache = {}
+
+    week = _espn_week(year, prefer_upcoming)  # network errors propagate, uncached
+
+    cache[key] = {"year": year, "week": week, "fetched_at": time.time()}
+    write_json_atomic(WEEK_CACHE, cache)
+    return week
+
+def _espn_week(year, prefer_upcoming):
+    url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard"
+    j = http_session().get(url, params={"year": year, "seasontype": 2}, timeout=20).json()
+    wk = (j.get("week") or {}).get("number")
+    if not (isinstance(wk, int) and 1 <= wk <= 23):
+        return 1
+
+    if prefer_upcoming:
+        # Probe this week and next concurrently; next week is only read when
+        # every game this week is final
+        def scoreboard(w):
+            return http_session().get(url, params={"year": year, "week": w, "seasontype": 2}, timeout=20).json()
+        pool = ThreadPoolExecutor(max_workers=2)
+        f_cur, f_nxt = pool.submit(scoreboard, wk), pool.submit(scoreboard, wk + 1)
+        pool.shutdown(wait=False)
+        cw = f_cur.result()
+        types = [((ev.get("competitions") or [{}])[0].get("status") or {}).get("type") or {}
+                 for ev in cw.get("events", [])]
+        if types and all(t.get("state") == "post" or "final" in (t.get("description") or "").lower()
+                         for t in types):
+            nxt = f_nxt.result()
+            if nxt.get("events"):
+                return wk + 1
+    return wk
+
 
 def fetch_current_results(year=None, week=None):
     if year is None or week is None:
@@ -89,19 +284,18 @@ def fetch_current_results(year=None, week=None):
         year = y if year is None else year
         week = w if week is None else week
 
-    games = fetch_from_espn(year, week)
+    df = fetch_from_espn(year, week)
 
-    if not games:
+    if df.empty:
         print(f"⚠️ ESPN has no data for {year} Week {week}, falling back to PFR...")
-        games = fetch_from_pfr(year, week)
+        df = fetch_from_pfr(year, week)
 
-    if not games:
+    if df.empty:
         print(f"❌ No games found for {year} Week {week}")
         return
 
-    df = pd.DataFrame(games)
     df.to_csv("data/current_results.csv", index=False)
-    print(f"✅ Saved {len(games)} games for {year} Week {week} (source: {games[0]['source']})")
+    print(f"✅ Saved {len(df)} games for {year} Week {week} (source: {df['source'].iat[0]})")
 
 if __name__ == "__main__":
     fetch_current_results()